@@ -0,0 +1,271 @@
+#-------------------------------------------------------------------------------
+# Name:        OrderLookup.py
+# Purpose:     This keeps an index of the expanded orders so dispatchers can
+#              find the route, sequence and arrival time of any order without
+#              opening the route layer files
+#-------------------------------------------------------------------------------
+import os
+import json
+import sqlite3
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, unquote
+
+# The index is saved next to the route layer files from the Expand Orders tool
+INDEX_FILE_NAME = "order_index.sqlite"
+
+
+def readOrderDependencies(order_dependencies_file):
+    """
+    Reads the file that was created when consolidating orders.
+
+    Returns a dictionary {super_order: [super_order, dependent_order, ...]}
+
+    """
+    order_dependencies = {}
+    with open(order_dependencies_file, "r") as f:
+        for line in f:
+            line = line.strip("\n")
+            if line == "":
+                continue
+            orders = [e for e in line.split(",")]
+            order_dependencies[orders[0]] = orders
+    return order_dependencies
+
+
+def memberToSuperOrder(order_dependencies):
+    """
+    Turns the order dependencies around so every member order points to the
+    super order it was consolidated into - {member_order: super_order}
+
+    """
+    super_orders = {}
+    for super_order in order_dependencies:
+        for order_name in order_dependencies[super_order]:
+            super_orders[order_name] = super_order
+    return super_orders
+
+
+class OrderIndex(object):
+    def __init__(self, index_file):
+        """
+        Opens (or creates) the order index saved at index_file.
+
+        Every order is stored as order_name -> (super_order, route_name,
+        sequence, arrive_time) keyed on the order name, so a lookup is a
+        single primary key read. Every query goes to the index file so a
+        server always sees the routes the Expand Orders tool refreshes.
+
+        """
+        self.index_file = index_file
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(index_file, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS orders (" \
+                                "order_name TEXT PRIMARY KEY, super_order TEXT, " \
+                                "route_name TEXT, sequence INTEGER, arrive_time TEXT) " \
+                                "WITHOUT ROWID")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS orders_route_name ON orders (route_name)")
+        self.connection.commit()
+
+    def close(self):
+        """Close the connection to the index file."""
+        with self.lock:
+            self.connection.close()
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+
+    def _asRecord(self, order_name, row):
+        return {"Name": order_name,
+                "SuperOrder": row[0],
+                "RouteName": row[1],
+                "Sequence": row[2],
+                "ArriveTime": row[3]}
+
+    def lookup(self, order_name):
+        """Returns the record for a single order or None if it isn't routed."""
+        with self.lock:
+            row = self.connection.execute("SELECT super_order, route_name, sequence, arrive_time " \
+                                          "FROM orders WHERE order_name = ?", (order_name,)).fetchone()
+        if row is None:
+            return None
+        return self._asRecord(order_name, row)
+
+    def lookupMany(self, order_names):
+        """Returns {order_name: record} for every order in order_names that is routed."""
+        records = {}
+        with self.lock:
+            for order_name in order_names:
+                row = self.connection.execute("SELECT super_order, route_name, sequence, arrive_time " \
+                                              "FROM orders WHERE order_name = ?", (order_name,)).fetchone()
+                if row is not None:
+                    records[order_name] = self._asRecord(order_name, row)
+        return records
+
+    def lookupPrefix(self, prefix, limit=100):
+        """Returns the records for up to limit orders whose name starts with prefix."""
+        with self.lock:
+            cursor = self.connection.execute("SELECT order_name, super_order, route_name, sequence, arrive_time " \
+                                             "FROM orders WHERE order_name >= ? AND order_name < ? " \
+                                             "ORDER BY order_name LIMIT ?",
+                                             (prefix, prefix + "\U0010ffff", limit))
+            rows = cursor.fetchall()
+        return [self._asRecord(row[0], row[1:]) for row in rows]
+
+    def lookupRoute(self, route_name):
+        """Returns the records for every order on a route in sequence order."""
+        with self.lock:
+            cursor = self.connection.execute("SELECT order_name, super_order, route_name, sequence, arrive_time " \
+                                             "FROM orders WHERE route_name = ? ORDER BY sequence",
+                                             (route_name,))
+            rows = cursor.fetchall()
+        return [self._asRecord(row[0], row[1:]) for row in rows]
+
+    def refreshRoute(self, route_name, stops, super_orders):
+        """
+        Replaces everything indexed for route_name with the stops of the route.
+
+        stops is an iterable of (order_name, sequence, arrive_time) and
+        super_orders is the {member_order: super_order} dictionary from
+        memberToSuperOrder. Stops that aren't orders (the depots) are skipped.
+
+        """
+        rows = []
+        for order_name, sequence, arrive_time in stops:
+            if order_name not in super_orders:
+                continue
+            if arrive_time is not None and not isinstance(arrive_time, str):
+                arrive_time = arrive_time.isoformat()
+            rows.append((order_name, super_orders[order_name], route_name, sequence, arrive_time))
+
+        with self.lock:
+            with self.connection:
+                self.connection.execute("DELETE FROM orders WHERE route_name = ?", (route_name,))
+                self.connection.executemany("INSERT OR REPLACE INTO orders VALUES (?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def pruneRoutes(self, route_names):
+        """
+        Removes every route that isn't in route_names, the routes of the
+        current plan, so orders on routes that are gone aren't answered with
+        an old route and arrival time. Returns the routes that were removed.
+
+        """
+        route_names = set(route_names)
+        with self.lock:
+            cursor = self.connection.execute("SELECT DISTINCT route_name FROM orders")
+            stale_routes = sorted(row[0] for row in cursor if row[0] not in route_names)
+            with self.connection:
+                self.connection.executemany("DELETE FROM orders WHERE route_name = ?", [(route_name,) for route_name in stale_routes])
+        return stale_routes
+
+
+def indexRouteLayer(order_index, layer_object, route_name, super_orders):
+    """
+    Reads the solved Stops of a route layer and refreshes the route in the
+    order index.
+
+    """
+    import arcpy
+
+    sublayer_names = arcpy.na.GetNAClassNames(layer_object)
+    stops_layer_name = sublayer_names["Stops"]
+    stops_layer_object = layer_object.listLayers(stops_layer_name)[0]
+    with arcpy.da.SearchCursor(stops_layer_object, ["Name", "Sequence", "ArriveTime"]) as cursor:
+        return order_index.refreshRoute(route_name, cursor, super_orders)
+
+
+def buildOrderIndex(order_dependencies_file, route_data_location):
+    """
+    Builds the order index from the route layer files already saved in
+    route_data_location by the Expand Orders tool.
+
+    """
+    import arcpy
+
+    super_orders = memberToSuperOrder(readOrderDependencies(order_dependencies_file))
+    order_index = OrderIndex(os.path.join(route_data_location, INDEX_FILE_NAME))
+    for file_name in sorted(os.listdir(route_data_location)):
+        if not file_name.endswith(".lyr"):
+            continue
+        route_name = file_name[:-len(".lyr")]
+        layer_object = arcpy.mp.LayerFile(os.path.join(route_data_location, file_name)).listLayers()[0]
+        arcpy.AddMessage("Indexing " + route_name)
+        indexRouteLayer(order_index, layer_object, route_name, super_orders)
+    return order_index
+
+
+class OrderLookupHandler(BaseHTTPRequestHandler):
+    """
+    Answers the dispatcher queries as JSON
+
+        GET /orders/<name>                  a single order
+        GET /orders?name=<name>&name=...    several orders at once
+        GET /orders?prefix=<prefix>         orders whose name starts with prefix
+        GET /routes/<route name>            every order on a route
+
+    """
+    order_index = None
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        parts = [unquote(p) for p in url.path.strip("/").split("/", 1)]
+
+        if parts[0] == "orders" and len(parts) == 2:
+            record = self.order_index.lookup(parts[1])
+            if record is None:
+                self._send(404, {"error": "Order {} not found".format(parts[1])})
+            else:
+                self._send(200, record)
+        elif parts[0] == "orders" and "name" in query:
+            self._send(200, self.order_index.lookupMany(query["name"]))
+        elif parts[0] == "orders" and "prefix" in query:
+            limit = query.get("limit", ["100"])[0]
+            if not limit.isdigit():
+                self._send(400, {"error": "limit has to be a whole number, not {}".format(limit)})
+            else:
+                self._send(200, self.order_index.lookupPrefix(query["prefix"][0], int(limit)))
+        elif parts[0] == "routes" and len(parts) == 2:
+            self._send(200, self.order_index.lookupRoute(parts[1]))
+        else:
+            self._send(400, {"error": "Unknown query {}".format(self.path)})
+
+    def log_message(self, format, *args):
+        return
+
+
+def serveOrderIndex(order_index, host="127.0.0.1", port=8765):
+    """Serve the order index over HTTP until interrupted."""
+    handler = type("BoundOrderLookupHandler", (OrderLookupHandler,), {"order_index": order_index})
+    server = ThreadingHTTPServer((host, port), handler)
+    print("Serving {} orders on http://{}:{}".format(len(order_index), host, port))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    route_data_location = '' # Put the path to the folder the Expand Orders tool saved the routes in
+    order_dependencies_file = '' # Put the path to the order dependency file, only needed to rebuild the index
+    index_file = os.path.join(route_data_location, INDEX_FILE_NAME)
+    try:
+        if os.path.exists(index_file):
+            order_index = OrderIndex(index_file)
+        else:
+            order_index = buildOrderIndex(order_dependencies_file, route_data_location)
+        serveOrderIndex(order_index)
+    except KeyboardInterrupt:
+        print("Stopped")
+    except:
+        print("Script Failed")
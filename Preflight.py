@@ -0,0 +1,190 @@
+#-------------------------------------------------------------------------------
+# Name:        Preflight.py
+# Purpose:     This checks the inputs of the Consolidate Orders and Expand
+#              Orders tools against each other before any network work starts
+#              so a bad input fails in seconds instead of at the end of a run
+#-------------------------------------------------------------------------------
+import os
+
+from OrderLookup import readOrderDependencies
+
+
+class PreflightError(Exception):
+    """Raised when the preflight checks find problems with the inputs."""
+    def __init__(self, problems):
+        self.problems = problems
+        Exception.__init__(self, "{} problem(s) found before running:\n{}".format(len(problems), "\n".join(problems)))
+
+
+def readKeyColumns(dataset, fields):
+    """Read only the key columns of a table or feature class in one pass."""
+    import arcpy
+
+    with arcpy.da.SearchCursor(dataset, fields) as cursor:
+        return [row for row in cursor]
+
+
+def findDuplicates(names):
+    """Returns the names that appear more than once, in the order first repeated."""
+    seen = set()
+    duplicates = []
+    for name in names:
+        if name in seen and name not in duplicates:
+            duplicates.append(name)
+        seen.add(name)
+    return duplicates
+
+
+def badNames(names):
+    """Returns the names that are empty or would break a Name = '...' selection."""
+    return [name for name in names if name is None or str(name).strip() == "" or "'" in str(name)]
+
+
+def describe(names):
+    return ", ".join(str(name) for name in names)
+
+
+def checkExpandInputs(order_dependencies, solved_stops_rows, routes_rows, depot_names, original_stop_names):
+    """
+    Cross checks the inputs of the Expand Orders tool.
+
+    order_dependencies  - {super_order: [super_order, dependent_order, ...]}
+    solved_stops_rows   - (Name, RouteName) of the VRP solved stops
+    routes_rows         - (Name, StartDepotName, EndDepotName) of the VRP routes
+    depot_names         - Name of every depot
+    original_stop_names - Name of every stop saved by the Consolidate Orders tool
+
+    Returns a list of problems, empty if everything is consistent.
+
+    """
+    problems = []
+
+    # Every order should only be consolidated into one super order
+    member_orders = [order_name for super_order in order_dependencies for order_name in order_dependencies[super_order]]
+    duplicates = findDuplicates(member_orders)
+    if duplicates:
+        problems.append("Orders listed more than once in the order dependency file: " + describe(duplicates))
+
+    # Every super order has to be in the solved stops with a route. The depots
+    # are visited at the start and end of every route so only the orders
+    # are checked for duplicates
+    stops_route_assignment = {}
+    for name, route_name in solved_stops_rows:
+        stops_route_assignment[name] = route_name
+    duplicates = findDuplicates(name for name, route_name in solved_stops_rows if name in order_dependencies)
+    if duplicates:
+        problems.append("Orders listed more than once in the solved stops: " + describe(duplicates))
+    missing = [order for order in order_dependencies if order not in stops_route_assignment]
+    if missing:
+        problems.append("Super orders missing from the solved stops: " + describe(missing))
+    unassigned = [order for order in order_dependencies if order in stops_route_assignment and stops_route_assignment[order] is None]
+    if unassigned:
+        problems.append("Super orders without a route in the solved stops: " + describe(unassigned))
+
+    # Every route the stops were assigned to has to be in the routes with depots
+    routes = {}
+    for name, start_depot, end_depot in routes_rows:
+        routes[name] = (start_depot, end_depot)
+    duplicates = findDuplicates(name for name, start_depot, end_depot in routes_rows)
+    if duplicates:
+        problems.append("Routes listed more than once in the routes: " + describe(duplicates))
+    route_names = set(route_name for route_name in stops_route_assignment.values() if route_name is not None)
+    missing = sorted(route_name for route_name in route_names if route_name not in routes)
+    if missing:
+        problems.append("Routes in the solved stops missing from the routes: " + describe(missing))
+    bad = badNames(route_names)
+    if bad:
+        problems.append("Route names that can't be selected by name: " + describe(bad))
+
+    depots = set(depot_names)
+    duplicates = findDuplicates(depot_names)
+    if duplicates:
+        problems.append("Depots listed more than once in the depots: " + describe(duplicates))
+    for route_name in sorted(route_names):
+        if route_name not in routes:
+            continue
+        start_depot, end_depot = routes[route_name]
+        if start_depot not in depots:
+            problems.append("Route {} starts at depot {} which is missing from the depots".format(route_name, start_depot))
+        if end_depot not in depots:
+            problems.append("Route {} ends at depot {} which is missing from the depots".format(route_name, end_depot))
+    bad = badNames(depots)
+    if bad:
+        problems.append("Depot names that can't be selected by name: " + describe(bad))
+
+    # Every order has to be in the stops saved when consolidating
+    original_stops = set(original_stop_names)
+    duplicates = findDuplicates(original_stop_names)
+    if duplicates:
+        problems.append("Orders listed more than once in the consolidate orders output stops: " + describe(duplicates))
+    missing = [order_name for order_name in member_orders if order_name not in original_stops]
+    if missing:
+        problems.append("Orders missing from the consolidate orders output stops: " + describe(missing))
+    bad = badNames(member_orders)
+    if bad:
+        problems.append("Order names that can't be selected by name: " + describe(bad))
+
+    return problems
+
+
+def checkConsolidateInputs(order_names, consolidated_orders_count, order_dependency_file):
+    """
+    Checks the inputs of the Consolidate Orders tool.
+
+    order_names               - USER_Customer_Name of every original order
+    consolidated_orders_count - number of rows already in the consolidated orders
+    order_dependency_file     - path of the order dependency file to write
+
+    Returns a list of problems, empty if everything is consistent.
+
+    """
+    problems = []
+
+    duplicates = findDuplicates(order_names)
+    if duplicates:
+        problems.append("Orders with the same name in the original orders: " + describe(duplicates))
+    bad = badNames(order_names)
+    if bad:
+        problems.append("Order names that can't be selected by name: " + describe(bad))
+
+    # The consolidated orders and dependency file are appended to so they have
+    # to start out empty
+    if consolidated_orders_count > 0:
+        problems.append("The consolidated orders already have {} rows, they should be empty".format(consolidated_orders_count))
+    if os.path.exists(order_dependency_file) and os.path.getsize(order_dependency_file) > 0:
+        problems.append("The order dependency file {} already exists and would be appended to".format(order_dependency_file))
+
+    return problems
+
+
+def reportProblems(problems):
+    """Add every problem as an error message and stop the tool if there were any."""
+    import arcpy
+
+    for problem in problems:
+        arcpy.AddError(problem)
+    if problems:
+        raise PreflightError(problems)
+    arcpy.AddMessage("Preflight checks passed")
+
+
+def preflightExpand(order_dependencies_file, solved_stops, input_routes, input_depots, stops_location):
+    """Load the key columns of the Expand Orders inputs and check them."""
+    if not os.path.exists(order_dependencies_file):
+        reportProblems(["The order dependency file {} doesn't exist".format(order_dependencies_file)])
+
+    order_dependencies = readOrderDependencies(order_dependencies_file)
+    solved_stops_rows = readKeyColumns(solved_stops, ["Name", "RouteName"])
+    routes_rows = readKeyColumns(input_routes, ["Name", "StartDepotName", "EndDepotName"])
+    depot_names = [row[0] for row in readKeyColumns(input_depots, ["Name"])]
+    original_stop_names = [row[0] for row in readKeyColumns(stops_location, ["Name"])]
+    reportProblems(checkExpandInputs(order_dependencies, solved_stops_rows, routes_rows, depot_names, original_stop_names))
+
+
+def preflightConsolidate(original_orders, consolidated_orders, order_dependency_file):
+    """Load the key columns of the Consolidate Orders inputs and check them."""
+    import arcpy
+
+    order_names = [row[0] for row in readKeyColumns(original_orders, ["USER_Customer_Name"])]
+    consolidated_orders_count = int(arcpy.management.GetCount(consolidated_orders)[0])
+    reportProblems(checkConsolidateInputs(order_names, consolidated_orders_count, order_dependency_file))
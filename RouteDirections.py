@@ -0,0 +1,74 @@
+#-------------------------------------------------------------------------------
+# Name:        RouteDirections.py
+# Purpose:     This generates the turn by turn directions for a route that was
+#              expanded without directions, the first time the route is asked
+#              for, and caches them next to the route layer file
+#-------------------------------------------------------------------------------
+import os
+
+
+def directionsFile(route_data_location, route_name):
+    """The cached directions for a route are saved next to its layer file."""
+    return os.path.join(route_data_location, route_name + "_directions.txt")
+
+
+def sharedMarkerFile(route_data_location, route_name):
+    """An empty file next to the layer file records that the route was shared."""
+    return os.path.join(route_data_location, route_name + "_shared")
+
+
+def markShared(route_data_location, route_name):
+    """Record that the route layer of route_name has been shared."""
+    with open(sharedMarkerFile(route_data_location, route_name), "w") as f:
+        f.write("")
+
+
+def clearDirections(route_data_location, route_name):
+    """Forget the cached directions and sharing of a route that is solved again."""
+    for path in (directionsFile(route_data_location, route_name), sharedMarkerFile(route_data_location, route_name)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def materializeDirections(route_data_location, route_name, share_route=True):
+    """
+    Makes sure the directions for route_name exist and returns the path of
+    the directions file.
+
+    The route layer saved by the Expand Orders tool is opened and the
+    directions are generated for it and saved. When share_route is True the
+    route layer is also shared so it can be opened in Navigator. The
+    directions and the sharing are each only done once, a route shared
+    later than its directions were made is still shared.
+
+    """
+    import arcpy
+
+    directions_file = directionsFile(route_data_location, route_name)
+    make_directions = not os.path.exists(directions_file)
+    share = share_route and not os.path.exists(sharedMarkerFile(route_data_location, route_name))
+    if not make_directions and not share:
+        return directions_file
+
+    saved_route_file = os.path.join(route_data_location, route_name + ".lyr")
+    layer_object = arcpy.mp.LayerFile(saved_route_file).listLayers()[0]
+    arcpy.CheckOutExtension("network")
+
+    if make_directions:
+        arcpy.AddMessage("Generating Directions for " + route_name)
+        arcpy.na.Directions(layer_object, "TEXT", directions_file, "Miles", "REPORT_TIME")
+    if share:
+        arcpy.na.ShareAsRouteLayers(layer_object)
+        markShared(route_data_location, route_name)
+    return directions_file
+
+
+if __name__ == '__main__':
+    route_data_location = '' # Put the path to the folder the Expand Orders tool saved the routes in
+    route_names = [] # Put the names of the routes that need directions
+    try:
+        for route_name in route_names:
+            print(materializeDirections(route_data_location, route_name))
+        print("Successful")
+    except:
+        print("Script Failed")
@@ -65,7 +65,15 @@ class Tool(object):
         parameterType="Required",
         direction="Output")
 
-        params = [param0, param1, param2, param3, param4, param5]
+        param6 = arcpy.Parameter(
+        displayName="Keep Intermediates In Memory",
+        name="in_memory",
+        datatype="GPBoolean",
+        parameterType="Optional",
+        direction="Input")
+        param6.value = False
+
+        params = [param0, param1, param2, param3, param4, param5, param6]
         return params
 
     def isLicensed(self):
@@ -88,15 +96,23 @@ class Tool(object):
         import os
         import sys
 
+        # The helper modules live next to the toolbox
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from Preflight import preflightConsolidate, PreflightError
+
         def consolidatedOrders(original_orders, consolidated_orders, network_dataset, \
                         undissolved_streets_network, order_dependency_file, \
-                        stops_location):
+                        stops_location, in_memory=False):
+
+            # Check the inputs before doing any network work
+            arcpy.AddMessage("Checking inputs...")
+            preflightConsolidate(original_orders, consolidated_orders, order_dependency_file)
 
                 # Create a Route Analysis layer so we can get the correct side of edge
             routes_object = arcpy.na.MakeRouteAnalysisLayer(network_dataset, "Route", \
                                     "Driving Time", "USE_CURRENT_ORDER", None, \
                                     "LOCAL_TIME_AT_LOCATIONS", "ALONG_NETWORK", \
-                                    None, "DIRECTIONS")
+                                    None, "NO_DIRECTIONS")
 
             layer_object = routes_object.getOutput(0)
             sublayer_names = arcpy.na.GetNAClassNames(layer_object)
@@ -105,8 +121,26 @@ class Tool(object):
             field_mappings = "Name USER_Customer_Name #"
             arcpy.na.AddLocations(layer_object, "Stops", original_orders, field_mappings)
 
-            # Save the Stops layer so we can use it again when expanding
-            arcpy.management.CopyFeatures(stops_layer_object, stops_location)
+            # Save the Stops layer so we can use it again when expanding. With
+            # in_memory the stops and the consolidated orders are worked on in the
+            # memory workspace and only written out once at the end
+            if in_memory:
+                if os.path.dirname(stops_location).lower() in ("memory", "in_memory"):
+                    memory_stops_location = stops_location
+                else:
+                    memory_stops_location = "memory/stops_location"
+                for name in (memory_stops_location, "memory/consolidate_stops", "memory/consolidated_orders", "memory_stops_layer"):
+                    if arcpy.Exists(name):
+                        arcpy.management.Delete(name)
+                arcpy.management.CopyFeatures(stops_layer_object, memory_stops_location)
+                memory_stops = arcpy.management.CopyFeatures(stops_layer_object, "memory/consolidate_stops").getOutput(0)
+                stops_layer_object = arcpy.management.MakeFeatureLayer(memory_stops, "memory_stops_layer").getOutput(0)
+                output_consolidated_orders = consolidated_orders
+                consolidated_orders = arcpy.management.CreateFeatureclass("memory", "consolidated_orders", "POINT", \
+                                    output_consolidated_orders, \
+                                    spatial_reference=arcpy.Describe(output_consolidated_orders).spatialReference).getOutput(0)
+            else:
+                arcpy.management.CopyFeatures(stops_layer_object, stops_location)
 
             # Perform a near analysis to the undissolved streets network
             arcpy.analysis.Near(stops_layer_object, undissolved_streets_network, None, \
@@ -137,6 +171,7 @@ class Tool(object):
 
             # Add a single consolidated order for each street segment and side of edge
             name_to_number_of_orders = {}
+            dependency_lines = []
 
             for side_of_edge in street_position_order:
                 for street_segment in street_position_order[side_of_edge]:
@@ -150,14 +185,17 @@ class Tool(object):
                     # Append to the consolidated orders feature class
                     arcpy.management.Append(stops_layer_object, consolidated_orders, "NO_TEST")
 
-                    # Write the order dependencies to a text file so they can be expanded
-                    # back out after we have a solution to the clustering
+                    # Keep the order dependencies so they can be expanded back out
+                    # after we have a solution to the clustering
                     dependent_orders = ""
                     if number_consolidating > 1:
                         for i in range(1, number_consolidating):
                             dependent_orders += ",{}".format(street_position_order[side_of_edge][street_segment][i][1])
-                    with open(order_dependency_file, "a") as f:
-                        f.write("{}{}\n".format(order_to_use_as_consolidate, dependent_orders))
+                    dependency_lines.append("{}{}\n".format(order_to_use_as_consolidate, dependent_orders))
+
+            # Write the order dependencies to a text file in one go
+            with open(order_dependency_file, "a") as f:
+                f.writelines(dependency_lines)
 
             # Update the table with the right service time and pickup quantity
             update_cursor = arcpy.da.UpdateCursor(consolidated_orders, ["Name", "ServiceTime", "PickupQuantities", "CurbApproach"])
@@ -167,18 +205,29 @@ class Tool(object):
                 row[2] = quantity
                 row[3] = 1
                 update_cursor.updateRow(row)
-
-    if __name__ == '__main__':
-        undissolved_streets_network = parameters[0].valueAsText#Put the path to the streets feature class that is the output from the Feature To Line
-        network_dataset = parameters[1].valueAsText #Put the path to the actual network dataset used for routing
-        original_orders = parameters[2].valueAsText #Put the path to the feature class of the order locations. 
-        consolidated_orders = parameters[3].valueAsText #Put the path to an empty feature class with the Orders schema
-        order_dependency_file = parameters[4].valueAsText # Put a path with filename.txt for the dependency of the consolidation to the full set of orders to be stored
-        stops_location = parameters[5].valueAsText # Put a path to a gdb with a feature class name such as orginal_stops to store the original orders in a feature class with schema needed for expanding
-    try:
-        consolidatedOrders(original_orders, consolidated_orders, network_dataset, undissolved_streets_network, order_dependency_file, stops_location)
-        print("Successful")
-    except:
-        print("Script Failed")
+            del update_cursor
+
+            # Write the outputs out of memory in one go
+            if in_memory:
+                arcpy.management.Append(consolidated_orders, output_consolidated_orders, "NO_TEST")
+                if memory_stops_location != stops_location:
+                    arcpy.management.CopyFeatures(memory_stops_location, stops_location)
+
+        if __name__ == '__main__':
+            undissolved_streets_network = parameters[0].valueAsText#Put the path to the streets feature class that is the output from the Feature To Line
+            network_dataset = parameters[1].valueAsText #Put the path to the actual network dataset used for routing
+            original_orders = parameters[2].valueAsText #Put the path to the feature class of the order locations. 
+            consolidated_orders = parameters[3].valueAsText #Put the path to an empty feature class with the Orders schema
+            order_dependency_file = parameters[4].valueAsText # Put a path with filename.txt for the dependency of the consolidation to the full set of orders to be stored
+            stops_location = parameters[5].valueAsText # Put a path to a gdb with a feature class name such as orginal_stops to store the original orders in a feature class with schema needed for expanding
+            in_memory = parameters[6].value # Check to keep the intermediates in the memory workspace and only write the outputs at the end
+        try:
+            consolidatedOrders(original_orders, consolidated_orders, network_dataset, undissolved_streets_network, order_dependency_file, stops_location, in_memory)
+            print("Successful")
+        except PreflightError:
+            # The problems were already reported, fail the tool
+            raise
+        except:
+            print("Script Failed")
 
         
\ No newline at end of file
@@ -87,7 +87,23 @@ class Tool(object):
         parameterType="Required",
         direction="Input")
  
-        params = [param0, param1, param2, param3, param4, param5, param6, param7, param8]
+        param9 = arcpy.Parameter(
+        displayName="Generate Directions On Solve",
+        name="generate_directions",
+        datatype="GPBoolean",
+        parameterType="Optional",
+        direction="Input")
+        param9.value = True
+
+        param10 = arcpy.Parameter(
+        displayName="Keep Intermediates In Memory",
+        name="in_memory",
+        datatype="GPBoolean",
+        parameterType="Optional",
+        direction="Input")
+        param10.value = False
+
+        params = [param0, param1, param2, param3, param4, param5, param6, param7, param8, param9, param10]
         return params
 
     def isLicensed(self):
@@ -109,19 +125,28 @@ class Tool(object):
         import arcpy
         import os
         import sys
+
+        # The helper modules live next to the toolbox
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from OrderLookup import OrderIndex, INDEX_FILE_NAME, readOrderDependencies, memberToSuperOrder, indexRouteLayer
+        from Preflight import preflightExpand, PreflightError
+        from RouteDirections import clearDirections, markShared
         
 
-        def ExpandOrders(order_dependencies_file, solved_stops, stops_location, network_dataset, input_routes, input_depots, route_data_location):
-     
+        def ExpandOrders(order_dependencies_file, solved_stops, stops_location, network_dataset, input_routes, input_depots, route_data_location, generate_directions=True, in_memory=False):
+
+            # Check the inputs against each other before doing any network work
+            arcpy.AddMessage("Checking inputs...")
+            preflightExpand(order_dependencies_file, solved_stops, input_routes, input_depots, stops_location)
+
         # Open the file that was created when consolidating orders so we can find
         # all of the dependent orders
-            order_dependencies = {}
-            with open (order_dependencies_file, "r") as f:
-                lines = f.readlines()
-                for line in lines:
-                    line = line.strip("\n")
-                    orders = [e for e in line.split(",")]
-                    order_dependencies[orders[0]] = orders
+            order_dependencies = readOrderDependencies(order_dependencies_file)
+
+            # Open the order index so every route we solve can be looked up
+            # by order name without opening the route layer files
+            super_orders = memberToSuperOrder(order_dependencies)
+            order_index = OrderIndex(os.path.join(route_data_location, INDEX_FILE_NAME))
 
             # Open the stops table and make a dictionary for the orders with their route
             # assignment and a list of all the route names
@@ -133,10 +158,21 @@ class Tool(object):
                 if row[1] not in route_names:
                     route_names.append(row[1])
 
+            # Drop the routes that aren't part of this plan from the order index
+            order_index.pruneRoutes(route_names)
+
             # Update the stops_location with the route assignment for all of the orders
             # based on the route the super order was assigned
             arcpy.AddMessage("Adding Route Assignments...")
-            arcpy.MakeFeatureLayer_management(stops_location, "original_stops_layer")
+            # With in_memory the route assignments are made on a copy of the
+            # stops in memory and written back to stops_location once at the end
+            if in_memory and os.path.dirname(stops_location).lower() not in ("memory", "in_memory"):
+                if arcpy.Exists("memory/original_stops"):
+                    arcpy.management.Delete("memory/original_stops")
+                working_stops_location = arcpy.management.CopyFeatures(stops_location, "memory/original_stops").getOutput(0)
+            else:
+                working_stops_location = stops_location
+            arcpy.MakeFeatureLayer_management(working_stops_location, "original_stops_layer")
             for order in order_dependencies:
                 # Get the route assignment
                 route_assignment = stops_route_assignment[order]
@@ -156,6 +192,13 @@ class Tool(object):
 
             # For each route name in the VRP problem make a route layer and solve it
             # with finding the best route preserving the first and last stop.
+            # Without generate_directions the routes are only solved for the
+            # geometry and stop times, the directions are made later by
+            # materializeDirections when a route is asked for
+            if generate_directions:
+                directions_option = "DIRECTIONS"
+            else:
+                directions_option = "NO_DIRECTIONS"
             arcpy.CheckOutExtension("network")
 
             # Create a feature layer for the depot
@@ -172,7 +215,7 @@ class Tool(object):
                 routes_object = arcpy.na.MakeRouteAnalysisLayer(network_dataset, route_name, \
                                         "Driving Time", "PRESERVE_BOTH", None, \
                                         "LOCAL_TIME_AT_LOCATIONS", "ALONG_NETWORK", \
-                                        None, "DIRECTIONS")
+                                        None, directions_option)
 
                 # Identify the Stops layer
                 layer_object = routes_object.getOutput(0)
@@ -212,7 +255,26 @@ class Tool(object):
                 arcpy.na.Solve(layer_object,"SKIP")
                 saved_route_file = os.path.join(route_data_location, route_name + ".lyr")
                 arcpy.management.SaveToLayerFile(layer_object, saved_route_file, "RELATIVE")
-                arcpy.na.ShareAsRouteLayers(layer_object)
+
+                # Directions and sharing from an earlier solve of this route are out of date
+                clearDirections(route_data_location, route_name)
+                if generate_directions:
+                    arcpy.na.ShareAsRouteLayers(layer_object)
+                    markShared(route_data_location, route_name)
+
+                # Replace whatever was indexed for this route with the new solve
+                indexRouteLayer(order_index, layer_object, route_name, super_orders)
+
+            order_index.close()
+
+            # Write the route assignments out of memory in one pass
+            if working_stops_location != stops_location:
+                assignment_fields = ["Name", "RouteName", "Attr_TravelTime", "Sequence", "CurbApproach"]
+                with arcpy.da.SearchCursor(working_stops_location, assignment_fields) as cursor:
+                    route_assignments = dict((row[0], tuple(row[1:])) for row in cursor)
+                with arcpy.da.UpdateCursor(stops_location, assignment_fields) as cursor:
+                    for row in cursor:
+                        cursor.updateRow((row[0],) + route_assignments[row[0]])
 
             arcpy.AddMessage("Finished running")
 
@@ -224,10 +286,15 @@ class Tool(object):
             stops_location = parameters[4].valueAsText # The location of the stops saved from the ConsolidateOrders script (should have all the original locations)
             network_dataset = parameters[5].valueAsText # The network dataset location
             route_data_location = parameters[6].valueAsText # Where the final zip file will be saved
+            generate_directions = parameters[9].value # Turn off to solve without directions and make them later with RouteDirections.materializeDirections
+            in_memory = parameters[10].value # Check to make the route assignments in the memory workspace and write them back once at the end
         try:
             ExpandOrders(order_dependencies_file, solved_stops, stops_location, \
-                    network_dataset, input_routes, input_depots, route_data_location)
+                    network_dataset, input_routes, input_depots, route_data_location, generate_directions, in_memory)
             print("Successful")
+        except PreflightError:
+            # The problems were already reported, fail the tool
+            raise
         except:
             print("Script Failed")      
 
@@ -0,0 +1,327 @@
+#-------------------------------------------------------------------------------
+# Name:        WatchConsolidateOrders.py
+# Purpose:     This watches a drop folder or geodatabase for new order sets
+#              and consolidates each one as it arrives, keeping the network,
+#              the streets and the located orders loaded between order sets
+#-------------------------------------------------------------------------------
+import os
+import json
+import time
+import zlib
+import datetime
+
+from Preflight import checkConsolidateInputs, reportProblems
+
+# The fields of a located stop that are saved for the Expand Orders tool and
+# the fields written for every consolidated order
+LOCATION_FIELDS = ["Name", "SHAPE@", "SourceID", "SourceOID", "PosAlong", "SideOfEdge", \
+                   "CurbApproach", "Status", "SnapX", "SnapY", "SnapZ", "DistanceToNetworkInMeters"]
+CONSOLIDATED_FIELDS = ["Name", "SHAPE@", "SourceID", "SourceOID", "PosAlong", "SideOfEdge", \
+                       "CurbApproach", "ServiceTime", "PickupQuantities"]
+
+
+def quickSignature(feature_class):
+    """The row count and largest ObjectID of a feature class, without reading every row."""
+    import arcpy
+
+    count = int(arcpy.management.GetCount(feature_class)[0])
+    oid_field = arcpy.Describe(feature_class).OIDFieldName
+    max_oid = 0
+    with arcpy.da.SearchCursor(feature_class, ["OID@"], sql_clause=(None, "ORDER BY {} DESC".format(oid_field))) as cursor:
+        for row in cursor:
+            max_oid = row[0]
+            break
+    return (count, max_oid)
+
+
+def checksumSignature(feature_class):
+    """
+    A checksum of the order names and locations of a feature class. It only
+    changes when the orders do, not when the feature class is read or locked.
+
+    """
+    import arcpy
+
+    checksum = 0
+    with arcpy.da.SearchCursor(feature_class, ["OID@", "USER_Customer_Name", "SHAPE@XY"]) as cursor:
+        for row in cursor:
+            checksum = zlib.crc32(repr(row).encode("utf-8"), checksum)
+    return checksum
+
+
+def cachedSignature(path, quick, signatures, pending, checksum_function):
+    """
+    Returns the signature (quick, checksum) of an order set. The checksum of
+    every row is only worked out again when the quick signature changed or
+    the order set is still pending, otherwise the one from signatures
+    {path: (quick, checksum)} is used.
+
+    """
+    if path in signatures and signatures[path][0] == quick and path not in pending:
+        return signatures[path]
+    signatures[path] = (quick, checksum_function(path))
+    return signatures[path]
+
+
+def findOrderSets(drop_location, signatures=None, pending=()):
+    """
+    Returns {order set path: signature} for every order set in the drop
+    location. The signature changes whenever the order set is changed.
+
+    A folder is searched for shapefiles, a geodatabase for feature classes.
+    The signatures of the feature classes are remembered in signatures
+    between polls so order sets that were already processed are only
+    counted, not read again. Order sets that can't be read right now (still
+    being written) are left out until the next time.
+
+    """
+    order_sets = {}
+    if signatures is None:
+        signatures = {}
+    if drop_location.lower().endswith(".gdb"):
+        import arcpy
+
+        arcpy.env.workspace = drop_location
+        for feature_class in arcpy.ListFeatureClasses():
+            path = os.path.join(drop_location, feature_class)
+            try:
+                order_sets[path] = cachedSignature(path, quickSignature(path), signatures, pending, checksumSignature)
+            except Exception:
+                continue
+    else:
+        for file_name in os.listdir(drop_location):
+            if not file_name.lower().endswith(".shp"):
+                continue
+            path = os.path.join(drop_location, file_name)
+            signature = []
+            try:
+                for extension in (".shp", ".dbf"):
+                    part = path[:-len(".shp")] + extension
+                    signature.extend([os.path.getmtime(part), os.path.getsize(part)])
+            except OSError:
+                continue
+            order_sets[path] = tuple(signature)
+    return order_sets
+
+
+class ChangeDebouncer(object):
+    def __init__(self, debounce_seconds):
+        """
+        Keeps track of the order sets that changed. An order set is only
+        ready once it has stopped changing for debounce_seconds, so a burst
+        of writes to the same order set is processed once.
+
+        """
+        self.debounce_seconds = debounce_seconds
+        self.processed = {}
+        self.pending = {}
+
+    def ready(self, order_sets, now):
+        """Returns the order sets from {path: signature} that are ready to process."""
+        ready = []
+        for path in order_sets:
+            signature = order_sets[path]
+            if self.processed.get(path) == signature:
+                self.pending.pop(path, None)
+                continue
+            if path not in self.pending or self.pending[path][0] != signature:
+                self.pending[path] = (signature, now)
+            elif now - self.pending[path][1] >= self.debounce_seconds:
+                ready.append(path)
+        return sorted(ready)
+
+    def done(self, path, signature):
+        self.processed[path] = signature
+        self.pending.pop(path, None)
+
+
+def groupOrdersOnStreets(rows):
+    """
+    Groups (street_segment, order_name, order_pos, side_of_edge) rows the
+    same way the Consolidate Orders tool does.
+
+    Returns {side_of_edge: {street_segment: [(posAlong, name)]}}
+
+    """
+    street_position_order = {}
+    for street_segment, order_name, order_pos, side_of_edge in rows:
+        if side_of_edge not in street_position_order:
+            street_position_order[side_of_edge] = {}
+        if street_segment not in street_position_order[side_of_edge]:
+            street_position_order[side_of_edge][street_segment] = []
+        street_position_order[side_of_edge][street_segment].append((order_pos, order_name))
+    return street_position_order
+
+
+class WarmConsolidator(object):
+    def __init__(self, network_dataset, undissolved_streets_network, consolidated_orders_template):
+        """
+        Opens the network and loads the streets once so every order set after
+        the first one starts warm.
+
+        Orders that were already located on the network are kept in
+        self.locations {order_name: ((x, y), location_row, street_segment)} and
+        are only located again when they move.
+
+        """
+        import arcpy
+
+        self.consolidated_orders_template = consolidated_orders_template
+        arcpy.CheckOutExtension("network")
+
+        # Create a Route Analysis layer so we can get the correct side of edge
+        routes_object = arcpy.na.MakeRouteAnalysisLayer(network_dataset, "WatchRoute", \
+                                    "Driving Time", "USE_CURRENT_ORDER", None, \
+                                    "LOCAL_TIME_AT_LOCATIONS", "ALONG_NETWORK", \
+                                    None, "NO_DIRECTIONS")
+        self.layer_object = routes_object.getOutput(0)
+        sublayer_names = arcpy.na.GetNAClassNames(self.layer_object)
+        self.stops_layer_object = self.layer_object.listLayers(sublayer_names["Stops"])[0]
+
+        # Keep the streets in memory for the near analysis
+        self.streets = arcpy.management.CopyFeatures(undissolved_streets_network, "memory/watch_streets").getOutput(0)
+
+        self.locations = {}
+
+    def locateOrders(self, original_orders, orders):
+        """
+        Locates the orders that aren't in self.locations yet.
+
+        orders is a list of (object_id, order_name, (x, y)). Returns the number
+        of orders that were located.
+
+        """
+        import arcpy
+
+        new_orders = [order for order in orders if order[1] not in self.locations or self.locations[order[1]][0] != order[2]]
+        if not new_orders:
+            return 0
+
+        oid_field = arcpy.Describe(original_orders).OIDFieldName
+        where = "{} IN ({})".format(oid_field, ", ".join(str(order[0]) for order in new_orders))
+        arcpy.MakeFeatureLayer_management(original_orders, "watch_new_orders", where)
+
+        arcpy.management.DeleteRows(self.stops_layer_object)
+        field_mappings = "Name USER_Customer_Name #"
+        arcpy.na.AddLocations(self.layer_object, "Stops", "watch_new_orders", field_mappings)
+        arcpy.analysis.Near(self.stops_layer_object, self.streets, None, \
+                        "NO_LOCATION", "NO_ANGLE", "PLANAR")
+        arcpy.management.Delete("watch_new_orders")
+
+        order_locations = dict((order[1], order[2]) for order in new_orders)
+        with arcpy.da.SearchCursor(self.stops_layer_object, LOCATION_FIELDS + ["NEAR_FID"]) as cursor:
+            for row in cursor:
+                self.locations[row[0]] = (order_locations[row[0]], tuple(row[:-1]), row[-1])
+        return len(new_orders)
+
+    def consolidate(self, original_orders, run_folder):
+        """
+        Consolidates one order set into run_folder, writing consolidated.gdb
+        with consolidated_orders and stops_location, order_dependencies.txt
+        and metrics.json. Returns the metrics.
+
+        """
+        import arcpy
+
+        start_time = time.time()
+        with arcpy.da.SearchCursor(original_orders, ["OID@", "USER_Customer_Name", "SHAPE@XY"]) as cursor:
+            orders = [tuple(row) for row in cursor]
+
+        order_dependency_file = os.path.join(run_folder, "order_dependencies.txt")
+        reportProblems(checkConsolidateInputs([order[1] for order in orders], 0, order_dependency_file))
+
+        located = self.locateOrders(original_orders, orders)
+        locate_time = time.time()
+
+        # Group the orders on the street segments from the located stops
+        index = dict((field, i) for i, field in enumerate(LOCATION_FIELDS))
+        rows = []
+        for object_id, order_name, xy in orders:
+            location_row, street_segment = self.locations[order_name][1:]
+            rows.append((street_segment, order_name, location_row[index["PosAlong"]], location_row[index["SideOfEdge"]]))
+        street_position_order = groupOrdersOnStreets(rows)
+
+        # Write everything for the run in one pass
+        gdb = arcpy.management.CreateFileGDB(run_folder, "consolidated.gdb").getOutput(0)
+        spatial_reference = arcpy.Describe(self.stops_layer_object).spatialReference
+        stops_location = arcpy.management.CreateFeatureclass(gdb, "stops_location", "POINT", \
+                                    self.stops_layer_object, spatial_reference=spatial_reference).getOutput(0)
+        with arcpy.da.InsertCursor(stops_location, LOCATION_FIELDS) as cursor:
+            for object_id, order_name, xy in orders:
+                cursor.insertRow(self.locations[order_name][1])
+
+        consolidated_orders = arcpy.management.CreateFeatureclass(gdb, "consolidated_orders", "POINT", \
+                                    self.consolidated_orders_template, spatial_reference=spatial_reference).getOutput(0)
+        consolidated_count = 0
+        with arcpy.da.InsertCursor(consolidated_orders, CONSOLIDATED_FIELDS) as cursor, \
+                open(order_dependency_file, "w") as f:
+            for side_of_edge in street_position_order:
+                for street_segment in street_position_order[side_of_edge]:
+                    orders_on_side = street_position_order[side_of_edge][street_segment]
+                    number_consolidating = len(orders_on_side)
+                    order_to_use_as_consolidate = orders_on_side[0][1]
+                    location_row = self.locations[order_to_use_as_consolidate][1]
+                    cursor.insertRow(location_row[:index["CurbApproach"]] + (1, number_consolidating*0.25, number_consolidating))
+                    consolidated_count += 1
+
+                    dependent_orders = "".join(",{}".format(order_name) for order_pos, order_name in orders_on_side[1:])
+                    f.write("{}{}\n".format(order_to_use_as_consolidate, dependent_orders))
+
+        metrics = {"order_set": original_orders,
+                   "orders": len(orders),
+                   "located": located,
+                   "location_cache_hits": len(orders) - located,
+                   "consolidated_orders": consolidated_count,
+                   "locate_seconds": round(locate_time - start_time, 3),
+                   "total_seconds": round(time.time() - start_time, 3)}
+        with open(os.path.join(run_folder, "metrics.json"), "w") as f:
+            json.dump(metrics, f, indent=2)
+        return metrics
+
+
+def watchConsolidateOrders(drop_location, output_folder, network_dataset, undissolved_streets_network, \
+                           consolidated_orders_template, poll_seconds=2, debounce_seconds=5):
+    """
+    Watches drop_location until interrupted and consolidates every new or
+    changed order set into its own folder in output_folder.
+
+    """
+    consolidator = WarmConsolidator(network_dataset, undissolved_streets_network, consolidated_orders_template)
+    debouncer = ChangeDebouncer(debounce_seconds)
+    signatures = {}
+    print("Watching " + drop_location)
+    while True:
+        try:
+            order_sets = findOrderSets(drop_location, signatures, debouncer.pending)
+        except Exception as e:
+            # Keep watching, the drop location is looked at again next time
+            print("Failed to look for order sets in {}: {}".format(drop_location, e))
+            order_sets = {}
+        for path in debouncer.ready(order_sets, time.time()):
+            name = os.path.splitext(os.path.basename(path))[0]
+            run_folder = os.path.join(output_folder, "{}_{}".format(name, datetime.datetime.now().strftime("%Y%m%d_%H%M%S")))
+            os.makedirs(run_folder)
+            try:
+                metrics = consolidator.consolidate(path, run_folder)
+                print("Consolidated {orders} orders into {consolidated_orders} in {total_seconds} seconds".format(**metrics))
+            except Exception as e:
+                # Keep watching, the order set is tried again once it changes
+                with open(os.path.join(run_folder, "metrics.json"), "w") as f:
+                    json.dump({"order_set": path, "error": str(e)}, f, indent=2)
+                print("Failed to consolidate {}: {}".format(path, e))
+            debouncer.done(path, order_sets[path])
+        time.sleep(poll_seconds)
+
+
+if __name__ == '__main__':
+    drop_location = '' # Put the path to the folder or gdb the order files are dropped in
+    output_folder = '' # Put the path to the folder to save the consolidated orders of every run in
+    network_dataset = '' #Put the path to the actual network dataset used for routing
+    undissolved_streets_network = '' #Put the path to the streets feature class that is the output from the Feature To Line
+    consolidated_orders_template = '' #Put the path to an empty feature class with the Orders schema
+    try:
+        watchConsolidateOrders(drop_location, output_folder, network_dataset, undissolved_streets_network, consolidated_orders_template)
+    except KeyboardInterrupt:
+        print("Stopped")
+    except:
+        print("Script Failed")
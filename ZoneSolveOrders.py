@@ -0,0 +1,343 @@
+#-------------------------------------------------------------------------------
+# Name:        ZoneSolveOrders.py
+# Purpose:     This splits the consolidated orders and depots into zones,
+#              solves the VRP of every zone in parallel and merges the solved
+#              stops and routes into the inputs the Expand Orders tool uses
+#-------------------------------------------------------------------------------
+import os
+import multiprocessing
+
+# The fields of the merged solved stops and routes, the Expand Orders tool
+# reads Name and RouteName from the stops and Name, StartDepotName and
+# EndDepotName from the routes
+STOPS_FIELDS = ["Name", "RouteName", "Sequence", "ArriveTime"]
+ROUTES_FIELDS = ["Name", "StartDepotName", "EndDepotName", "OrderCount", "TotalCost"]
+
+
+def distanceSquared(a, b):
+    return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2
+
+
+def nearest(point, centers):
+    """Returns the key of the center in {key: (x, y)} closest to point."""
+    return min(centers, key=lambda key: distanceSquared(point, centers[key]))
+
+
+def kMeans(points, zone_count, iterations=25):
+    """
+    Clusters the (x, y) points into zone_count groups and returns the centers.
+
+    The first centers are picked by taking the point farthest from the
+    centers already picked so the result is the same on every run.
+
+    """
+    centers = [points[0]]
+    while len(centers) < min(zone_count, len(points)):
+        centers.append(max(points, key=lambda point: min(distanceSquared(point, center) for center in centers)))
+
+    for i in range(iterations):
+        sums = [[0.0, 0.0, 0] for center in centers]
+        for point in points:
+            closest = min(range(len(centers)), key=lambda c: distanceSquared(point, centers[c]))
+            sums[closest][0] += point[0]
+            sums[closest][1] += point[1]
+            sums[closest][2] += 1
+        new_centers = []
+        for c in range(len(centers)):
+            if sums[c][2] == 0:
+                new_centers.append(centers[c])
+            else:
+                new_centers.append((sums[c][0] / sums[c][2], sums[c][1] / sums[c][2]))
+        if new_centers == centers:
+            break
+        centers = new_centers
+    return centers
+
+
+def buildZones(order_zone, routes, depot_zone):
+    """
+    Groups the orders, routes and depots by zone.
+
+    order_zone - {order_name: zone}
+    routes     - (Name, StartDepotName, EndDepotName) of every route
+    depot_zone - {start_depot_name: zone}
+
+    Every route goes to the zone of the depot it starts at and brings its
+    start and end depot with it.
+
+    """
+    zones = {}
+    for route_name, start_depot, end_depot in routes:
+        zone_name = depot_zone[start_depot]
+        if zone_name not in zones:
+            zones[zone_name] = {"name": zone_name, "orders": [], "depots": [], "routes": []}
+        zone = zones[zone_name]
+        zone["routes"].append((route_name, start_depot, end_depot))
+        for depot_name in (start_depot, end_depot):
+            if depot_name is not None and depot_name not in zone["depots"]:
+                zone["depots"].append(depot_name)
+    for order_name in order_zone:
+        zones[order_zone[order_name]]["orders"].append(order_name)
+    return [zones[zone_name] for zone_name in sorted(zones, key=str)]
+
+
+def partitionByDepot(orders, depots, routes):
+    """
+    Puts every order in the zone of the closest depot a route starts at.
+
+    orders - (Name, x, y) of every consolidated order
+    depots - {Name: (x, y)} of every depot
+    routes - (Name, StartDepotName, EndDepotName) of every route
+
+    """
+    start_depots = {}
+    for route_name, start_depot, end_depot in routes:
+        start_depots[start_depot] = depots[start_depot]
+
+    order_zone = {}
+    for order_name, x, y in orders:
+        order_zone[order_name] = nearest((x, y), start_depots)
+    depot_zone = {}
+    for depot_name in start_depots:
+        depot_zone[depot_name] = depot_name
+    return buildZones(order_zone, routes, depot_zone)
+
+
+def partitionByCluster(orders, depots, routes, zone_count):
+    """
+    Clusters the orders (one per street segment after consolidating) into
+    zone_count zones and gives every zone the routes whose depot is closest
+    to it. Orders in a cluster without any routes go to the zone of the
+    closest depot a route starts at.
+
+    """
+    centers = kMeans([(x, y) for order_name, x, y in orders], zone_count)
+    centers = dict(enumerate(centers))
+
+    depot_zone = {}
+    for route_name, start_depot, end_depot in routes:
+        depot_zone[start_depot] = nearest(depots[start_depot], centers)
+    start_depots = {}
+    for depot_name in depot_zone:
+        start_depots[depot_name] = depots[depot_name]
+    zones_with_routes = set(depot_zone.values())
+
+    order_zone = {}
+    for order_name, x, y in orders:
+        zone_name = nearest((x, y), centers)
+        if zone_name not in zones_with_routes:
+            zone_name = depot_zone[nearest((x, y), start_depots)]
+        order_zone[order_name] = zone_name
+    return buildZones(order_zone, routes, depot_zone)
+
+
+def stubSolveZone(zone):
+    """
+    A solver that doesn't need the network, used to test the partitioning and
+    merging. The orders are handed out to the routes of the zone in turn.
+
+    """
+    route_orders = dict((route[0], []) for route in zone["routes"])
+    for i, order_name in enumerate(zone["orders"]):
+        route_orders[zone["routes"][i % len(zone["routes"])][0]].append(order_name)
+
+    stops = []
+    routes = []
+    for route_name, start_depot, end_depot in zone["routes"]:
+        for sequence, order_name in enumerate(route_orders[route_name]):
+            stops.append((order_name, route_name, sequence + 2, None))
+        routes.append((route_name, start_depot, end_depot, len(route_orders[route_name]), 0.0))
+    return stops, routes
+
+
+def solveZoneVRP(zone):
+    """
+    Solves the VRP for a single zone and returns (stops, routes) as rows of
+    STOPS_FIELDS and ROUTES_FIELDS. This runs in its own worker process.
+
+    """
+    import arcpy
+
+    def nameIn(names):
+        return "Name IN ({})".format(", ".join("'{}'".format(name) for name in names))
+
+    arcpy.CheckOutExtension("network")
+    layer_name = "VRP_{}".format(zone["name"])
+    vrp_object = arcpy.na.MakeVehicleRoutingProblemAnalysisLayer(zone["network_dataset"], layer_name, \
+                                    "Driving Time", generate_directions_on_solve="NO_DIRECTIONS")
+    layer_object = vrp_object.getOutput(0)
+
+    # Load only the orders, depots and routes of this zone. A worker solves
+    # several zones so the layers are named for the zone
+    orders_layer = "zone_orders_{}".format(zone["name"])
+    depots_layer = "zone_depots_{}".format(zone["name"])
+    routes_view = "zone_routes_{}".format(zone["name"])
+    arcpy.MakeFeatureLayer_management(zone["consolidated_orders"], orders_layer, nameIn(zone["orders"]))
+    arcpy.na.AddLocations(layer_object, "Orders", orders_layer)
+    arcpy.MakeFeatureLayer_management(zone["input_depots"], depots_layer, nameIn(zone["depots"]))
+    arcpy.na.AddLocations(layer_object, "Depots", depots_layer)
+    arcpy.MakeTableView_management(zone["input_routes"], routes_view, nameIn([route[0] for route in zone["routes"]]))
+    arcpy.na.AddLocations(layer_object, "Routes", routes_view)
+
+    arcpy.na.Solve(layer_object, "SKIP")
+
+    sublayer_names = arcpy.na.GetNAClassNames(layer_object)
+    orders_layer_object = layer_object.listLayers(sublayer_names["Orders"])[0]
+    routes_layer_object = layer_object.listLayers(sublayer_names["Routes"])[0]
+    with arcpy.da.SearchCursor(orders_layer_object, STOPS_FIELDS) as cursor:
+        stops = [tuple(row) for row in cursor]
+    with arcpy.da.SearchCursor(routes_layer_object, ROUTES_FIELDS) as cursor:
+        routes = [tuple(row) for row in cursor]
+
+    for name in (orders_layer, depots_layer, routes_view, layer_object):
+        arcpy.management.Delete(name)
+    return stops, routes
+
+
+def solveZones(zones, solve_function=solveZoneVRP, workers=None):
+    """
+    Solves every zone with solve_function, in parallel worker processes when
+    there is more than one worker, and merges the results.
+
+    Returns (stops, routes) for all of the zones together. Zones without any
+    orders aren't solved, their routes are returned without stops.
+
+    """
+    results = []
+    zones_to_solve = []
+    for zone in zones:
+        if zone["orders"]:
+            zones_to_solve.append(zone)
+        else:
+            results.append(([], [(route_name, start_depot, end_depot, 0, 0.0) \
+                                 for route_name, start_depot, end_depot in zone["routes"]]))
+
+    if workers is None:
+        workers = min(len(zones_to_solve), multiprocessing.cpu_count())
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        try:
+            results.extend(pool.map(solve_function, zones_to_solve))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results.extend(solve_function(zone) for zone in zones_to_solve)
+
+    return mergeZoneResults(results)
+
+
+def mergeZoneResults(results):
+    """Puts the (stops, routes) of every zone together, each order and route has to be in only one zone."""
+    stops = []
+    routes = []
+    order_names = set()
+    route_names = set()
+    for zone_stops, zone_routes in results:
+        for row in zone_stops:
+            if row[0] in order_names:
+                raise ValueError("Order {} was solved in more than one zone".format(row[0]))
+            order_names.add(row[0])
+            stops.append(row)
+        for row in zone_routes:
+            if row[0] in route_names:
+                raise ValueError("Route {} was solved in more than one zone".format(row[0]))
+            route_names.add(row[0])
+            routes.append(row)
+    return stops, routes
+
+
+def writeMergedResults(stops, routes, consolidated_orders, output_workspace):
+    """
+    Saves the merged stops as a point feature class (solved_stops) at the
+    consolidated order locations and the merged routes as a table (routes)
+    in output_workspace, replacing them if they are already there. Returns
+    the paths of both.
+
+    """
+    import arcpy
+
+    order_locations = {}
+    with arcpy.da.SearchCursor(consolidated_orders, ["Name", "SHAPE@XY"]) as cursor:
+        for row in cursor:
+            order_locations[row[0]] = row[1]
+
+    # The stage is run into the same workspace every night so the outputs of
+    # the last run are replaced
+    for name in ("solved_stops", "routes"):
+        if arcpy.Exists(os.path.join(output_workspace, name)):
+            arcpy.management.Delete(os.path.join(output_workspace, name))
+
+    spatial_reference = arcpy.Describe(consolidated_orders).spatialReference
+    solved_stops = arcpy.management.CreateFeatureclass(output_workspace, "solved_stops", "POINT", \
+                                    spatial_reference=spatial_reference).getOutput(0)
+    arcpy.management.AddField(solved_stops, "Name", "TEXT", field_length=500)
+    arcpy.management.AddField(solved_stops, "RouteName", "TEXT", field_length=500)
+    arcpy.management.AddField(solved_stops, "Sequence", "LONG")
+    arcpy.management.AddField(solved_stops, "ArriveTime", "DATE")
+    with arcpy.da.InsertCursor(solved_stops, ["SHAPE@XY"] + STOPS_FIELDS) as cursor:
+        for row in stops:
+            cursor.insertRow((order_locations[row[0]],) + tuple(row))
+
+    output_routes = arcpy.management.CreateTable(output_workspace, "routes").getOutput(0)
+    arcpy.management.AddField(output_routes, "Name", "TEXT", field_length=500)
+    arcpy.management.AddField(output_routes, "StartDepotName", "TEXT", field_length=500)
+    arcpy.management.AddField(output_routes, "EndDepotName", "TEXT", field_length=500)
+    arcpy.management.AddField(output_routes, "OrderCount", "LONG")
+    arcpy.management.AddField(output_routes, "TotalCost", "DOUBLE")
+    with arcpy.da.InsertCursor(output_routes, ROUTES_FIELDS) as cursor:
+        for row in routes:
+            cursor.insertRow(row)
+
+    return solved_stops, output_routes
+
+
+def zoneSolveOrders(consolidated_orders, input_depots, input_routes, network_dataset, \
+                    output_workspace, zone_count=None, workers=None, solve_function=solveZoneVRP):
+    """
+    Splits the consolidated orders into zones, solves every zone and saves
+    the merged solved stops and routes for the Expand Orders tool.
+
+    Without zone_count every depot a route starts at gets its own zone,
+    otherwise the orders are clustered into zone_count zones.
+
+    """
+    import arcpy
+
+    with arcpy.da.SearchCursor(consolidated_orders, ["Name", "SHAPE@XY"]) as cursor:
+        orders = [(row[0], row[1][0], row[1][1]) for row in cursor]
+    with arcpy.da.SearchCursor(input_depots, ["Name", "SHAPE@XY"]) as cursor:
+        depots = dict((row[0], row[1]) for row in cursor)
+    with arcpy.da.SearchCursor(input_routes, ["Name", "StartDepotName", "EndDepotName"]) as cursor:
+        routes = [tuple(row) for row in cursor]
+
+    if zone_count is None:
+        zones = partitionByDepot(orders, depots, routes)
+    else:
+        zones = partitionByCluster(orders, depots, routes, zone_count)
+
+    # The workers open the data themselves so they only need the paths
+    for zone in zones:
+        arcpy.AddMessage("Zone {}: {} orders, {} routes".format(zone["name"], len(zone["orders"]), len(zone["routes"])))
+        zone["consolidated_orders"] = consolidated_orders
+        zone["input_depots"] = input_depots
+        zone["input_routes"] = input_routes
+        zone["network_dataset"] = network_dataset
+
+    arcpy.AddMessage("Solving {} zones...".format(len(zones)))
+    stops, routes = solveZones(zones, solve_function, workers)
+    return writeMergedResults(stops, routes, consolidated_orders, output_workspace)
+
+
+if __name__ == '__main__':
+    consolidated_orders = '' # Put the path to the consolidated orders from the Consolidate Orders tool
+    input_depots = '' # Put the path to the depots feature class
+    input_routes = '' # Put the path to the routes table or feature class
+    network_dataset = '' # Put the path to the network dataset used for routing
+    output_workspace = '' # Put the path to a gdb to save the solved_stops and routes in for the Expand Orders tool
+    zone_count = None # Leave as None for one zone per depot or put the number of zones to cluster the orders into
+    try:
+        zoneSolveOrders(consolidated_orders, input_depots, input_routes, network_dataset, output_workspace, zone_count)
+        print("Successful")
+    except:
+        print("Script Failed")
@@ -0,0 +1,81 @@
+import os
+import sys
+import json
+import threading
+import urllib.request
+import urllib.error
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from OrderLookup import OrderIndex, OrderLookupHandler, memberToSuperOrder
+
+
+SUPER_ORDERS = memberToSuperOrder({"A": ["A", "A1"], "B": ["B"]})
+
+
+def test_refresh_is_seen_by_another_index(tmp_path):
+    index_file = str(tmp_path / "order_index.sqlite")
+    writer = OrderIndex(index_file)
+    server = OrderIndex(index_file)
+
+    writer.refreshRoute("R1", [("D1", 1, None), ("A", 2, None), ("A1", 3, None), ("D1", 4, None)], SUPER_ORDERS)
+    assert server.lookup("A")["RouteName"] == "R1"
+    assert server.lookup("D1") is None
+    assert len(server) == 2
+
+    # Expanding the route again moves A1 to another route
+    writer.refreshRoute("R1", [("A", 2, None)], SUPER_ORDERS)
+    writer.refreshRoute("R2", [("A1", 2, None), ("B", 3, None)], SUPER_ORDERS)
+    assert server.lookup("A1")["RouteName"] == "R2"
+    assert sorted(server.lookupMany(["A", "A1", "X"])) == ["A", "A1"]
+    assert [record["Name"] for record in server.lookupPrefix("A")] == ["A", "A1"]
+    assert [record["Name"] for record in server.lookupRoute("R2")] == ["A1", "B"]
+    writer.close()
+    server.close()
+
+
+def test_http_queries(tmp_path):
+    order_index = OrderIndex(str(tmp_path / "order_index.sqlite"))
+    order_index.refreshRoute("R1", [("A", 2, None), ("A1", 3, None)], SUPER_ORDERS)
+    handler = type("TestHandler", (OrderLookupHandler,), {"order_index": order_index})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:{}".format(server.server_address[1])
+
+    def get(path):
+        try:
+            with urllib.request.urlopen(url + path) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    try:
+        assert get("/orders/A1")[1]["SuperOrder"] == "A"
+        assert get("/orders/X")[0] == 404
+        assert len(get("/orders?prefix=A&limit=1")[1]) == 1
+        assert get("/orders?prefix=A&limit=abc")[0] == 400
+    finally:
+        server.shutdown()
+        server.server_close()
+        order_index.close()
+
+
+def test_routes_gone_from_the_plan_are_pruned(tmp_path):
+    index_file = str(tmp_path / "order_index.sqlite")
+
+    # Yesterday's run had two routes
+    order_index = OrderIndex(index_file)
+    order_index.pruneRoutes(["R1", "R2"])
+    order_index.refreshRoute("R1", [("A", 2, None), ("A1", 3, None)], SUPER_ORDERS)
+    order_index.refreshRoute("R2", [("B", 2, None)], SUPER_ORDERS)
+    order_index.close()
+
+    # Today's plan only has R1 and B was dropped
+    order_index = OrderIndex(index_file)
+    assert order_index.pruneRoutes(["R1"]) == ["R2"]
+    order_index.refreshRoute("R1", [("A", 2, None), ("A1", 3, None)], SUPER_ORDERS)
+    assert order_index.lookup("B") is None
+    assert order_index.lookupRoute("R2") == []
+    assert len(order_index) == 2
+    order_index.close()
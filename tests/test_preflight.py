@@ -0,0 +1,38 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Preflight import checkExpandInputs, checkConsolidateInputs
+
+
+def test_output_stops_with_depots_pass():
+    # The VRP Output Stops visit the depot at the start and end of every route
+    solved_stops = [("D1", "R1"), ("A", "R1"), ("C", "R1"), ("D1", "R1"),
+                    ("D1", "R2"), ("E", "R2"), ("D1", "R2")]
+    problems = checkExpandInputs({"A": ["A", "B"], "C": ["C"], "E": ["E"]}, solved_stops,
+                                 [("R1", "D1", "D1"), ("R2", "D1", "D1")], ["D1"], ["A", "B", "C", "E"])
+    assert problems == []
+
+
+def test_duplicate_orders_in_solved_stops():
+    solved_stops = [("D1", "R1"), ("A", "R1"), ("A", "R1"), ("D1", "R1")]
+    problems = checkExpandInputs({"A": ["A"]}, solved_stops, [("R1", "D1", "D1")], ["D1"], ["A"])
+    assert problems == ["Orders listed more than once in the solved stops: A"]
+
+
+def test_missing_routes_depots_and_orders():
+    problems = checkExpandInputs({"A": ["A", "a1"], "B": ["B", "a1"], "C": ["C"]},
+                                 [("A", "R1"), ("B", "R2"), ("X", None)],
+                                 [("R1", "D1", "D2")], ["D1"], ["A", "a1", "B"])
+    assert problems == ["Orders listed more than once in the order dependency file: a1",
+                        "Super orders missing from the solved stops: C",
+                        "Routes in the solved stops missing from the routes: R2",
+                        "Route R1 ends at depot D2 which is missing from the depots",
+                        "Orders missing from the consolidate orders output stops: C"]
+
+
+def test_consolidate_names():
+    problems = checkConsolidateInputs(["a", "a", "o'b", None], 0, os.path.join(os.path.dirname(__file__), "missing.txt"))
+    assert problems == ["Orders with the same name in the original orders: a",
+                        "Order names that can't be selected by name: o'b, None"]
@@ -0,0 +1,19 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from RouteDirections import directionsFile, sharedMarkerFile, markShared, clearDirections
+
+
+def test_solving_a_route_again_clears_directions_and_sharing(tmp_path):
+    route_data_location = str(tmp_path)
+    with open(directionsFile(route_data_location, "R1"), "w") as f:
+        f.write("Start at Depot")
+    markShared(route_data_location, "R1")
+    markShared(route_data_location, "R2")
+
+    clearDirections(route_data_location, "R1")
+    assert not os.path.exists(directionsFile(route_data_location, "R1"))
+    assert not os.path.exists(sharedMarkerFile(route_data_location, "R1"))
+    assert os.path.exists(sharedMarkerFile(route_data_location, "R2"))
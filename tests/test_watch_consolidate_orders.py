@@ -0,0 +1,50 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from WatchConsolidateOrders import ChangeDebouncer, cachedSignature, findOrderSets, groupOrdersOnStreets
+
+
+def test_debouncer_waits_for_changes_to_settle():
+    debouncer = ChangeDebouncer(5)
+    assert debouncer.ready({"a": 1}, 0) == []
+    assert debouncer.ready({"a": 2}, 3) == []
+    assert debouncer.ready({"a": 2}, 7) == []
+    assert debouncer.ready({"a": 2, "b": 1}, 8) == ["a"]
+    debouncer.done("a", 2)
+    assert debouncer.ready({"a": 2, "b": 1}, 20) == ["b"]
+    debouncer.done("b", 1)
+    assert debouncer.ready({"a": 3, "b": 1}, 21) == []
+    assert debouncer.ready({"a": 3, "b": 1}, 26) == ["a"]
+
+
+def test_find_shapefiles_in_a_folder(tmp_path):
+    for name in ("monday.shp", "monday.dbf", "monday.shp.host.123.sr.lock", "tuesday.shp", "notes.txt"):
+        (tmp_path / name).write_text(name)
+    order_sets = findOrderSets(str(tmp_path))
+    # tuesday is still being copied, it doesn't have its .dbf yet
+    assert list(order_sets) == [str(tmp_path / "monday.shp")]
+
+
+def test_group_orders_on_streets():
+    rows = [(1, "x", 0.1, 1), (1, "y", 0.2, 1), (2, "z", 0.3, 2), (1, "w", 0.4, 2)]
+    assert groupOrdersOnStreets(rows) == {1: {1: [(0.1, "x"), (0.2, "y")]},
+                                          2: {2: [(0.3, "z")], 1: [(0.4, "w")]}}
+
+
+def test_checksum_only_when_the_quick_signature_changes_or_pending():
+    checksummed = []
+
+    def checksum(path):
+        checksummed.append(path)
+        return len(checksummed)
+
+    signatures = {}
+    assert cachedSignature("a", (10, 10), signatures, {}, checksum) == ((10, 10), 1)
+    # Still settling, so the rows are checked again
+    assert cachedSignature("a", (10, 10), signatures, {"a": None}, checksum) == ((10, 10), 2)
+    # Processed and unchanged, only the quick signature is read
+    assert cachedSignature("a", (10, 10), signatures, {}, checksum) == ((10, 10), 2)
+    assert cachedSignature("a", (11, 11), signatures, {}, checksum) == ((11, 11), 3)
+    assert checksummed == ["a", "a", "a"]
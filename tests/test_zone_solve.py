@@ -0,0 +1,39 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ZoneSolveOrders import partitionByDepot, partitionByCluster, solveZones, stubSolveZone
+
+
+ORDERS = [("O{}".format(i), float(x), float(y)) for i, (x, y) in enumerate(
+    [(1, 1), (2, 1), (1, 2), (3, 3), (98, 99), (99, 98), (97, 97), (99, 99)])]
+DEPOTS = {"D1": (0.0, 0.0), "D2": (100.0, 100.0), "D3": (-500.0, 500.0), "DX": (50.0, 50.0)}
+ROUTES = [("R1", "D1", "D1"), ("R2", "D1", "DX"), ("R3", "D2", "D2"), ("R4", "D3", "D3")]
+
+
+def checkMerged(stops, routes):
+    assert sorted(stop[0] for stop in stops) == sorted(order[0] for order in ORDERS)
+    assert sorted(route[0] for route in routes) == ["R1", "R2", "R3", "R4"]
+    route_depots = dict((route[0], route[1:3]) for route in routes)
+    for route_name, start_depot, end_depot in ROUTES:
+        assert route_depots[route_name] == (start_depot, end_depot)
+
+
+def test_partition_by_depot_with_empty_zone():
+    zones = partitionByDepot(ORDERS, DEPOTS, ROUTES)
+    orders_per_zone = dict((zone["name"], len(zone["orders"])) for zone in zones)
+    assert orders_per_zone == {"D1": 4, "D2": 4, "D3": 0}
+    assert [zone["depots"] for zone in zones] == [["D1", "DX"], ["D2"], ["D3"]]
+
+    stops, routes = solveZones(zones, stubSolveZone, workers=1)
+    checkMerged(stops, routes)
+    assert [route for route in routes if route[0] == "R4"] == [("R4", "D3", "D3", 0, 0.0)]
+
+
+def test_partition_by_cluster_in_parallel():
+    zones = partitionByCluster(ORDERS, DEPOTS, ROUTES, 2)
+    assert sum(len(zone["orders"]) for zone in zones) == len(ORDERS)
+
+    stops, routes = solveZones(zones, stubSolveZone, workers=2)
+    checkMerged(stops, routes)